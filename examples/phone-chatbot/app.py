@@ -1,23 +1,35 @@
-from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import BackgroundTasks, Depends, FastAPI, Form, Request, HTTPException
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
+from starlette.datastructures import ImmutableMultiDict
 import logging
-import sys
+from contextlib import asynccontextmanager
 import traceback
-from datetime import datetime
 import os
-from typing import Optional, Dict, Any
+import random
+import time
+from functools import lru_cache
+from typing import Annotated, Optional, Dict, Any, FrozenSet, Tuple, Union
+import orjson
+import redis.asyncio as redis
+from logging_config import configure_logging
+from call_state import (
+    ANONYMOUS_CALL_SID,
+    MemoryCallStore,
+    RedisCallStore,
+    log_summary,
+)
 from twilio.request_validator import RequestValidator
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    stream=sys.stdout
-)
+configure_logging(logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Fraction of webhook payloads to log in full
+REQUEST_LOG_SAMPLE_RATE = 0.01
+
 # Required environment variables
 REQUIRED_ENV_VARS = {
     "TWILIO_ACCOUNT_SID": "Twilio Account SID",
@@ -29,36 +41,55 @@ REQUIRED_ENV_VARS = {
 OPTIONAL_ENV_VARS = {
     "DAILY_API_KEY": "Daily.co API key (optional)",
     "GOOGLE_API_KEY": "Google API key (optional)",
-    "DEEPGRAM_API_KEY": "Deepgram API key (optional)"
+    "DEEPGRAM_API_KEY": "Deepgram API key (optional)",
+    "REDIS_URL": "Redis URL for call state shared across workers (optional)",
+    "ALLOWED_ORIGINS": "Comma-separated CORS origins (optional)"
 }
 
-# Log environment variables (without values for security)
-logger.info("Checking environment variables...")
-for var, description in REQUIRED_ENV_VARS.items():
-    if os.getenv(var):
-        logger.info(f"{var} is set")
-    else:
-        logger.error(f"{var} is not set - {description} (REQUIRED)")
-        raise ValueError(f"{var} is required but not set")
+# Browser origins allowed to call the API; credentials can't be combined with "*"
+ALLOWED_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv("ALLOWED_ORIGINS", "https://example.com").split(",")
+    if origin.strip()
+]
 
-for var, description in OPTIONAL_ENV_VARS.items():
-    if os.getenv(var):
-        logger.info(f"{var} is set")
-    else:
-        logger.warning(f"{var} is not set - {description}")
-
-# Initialize Twilio validator
-twilio_validator = RequestValidator(os.getenv("TWILIO_AUTH_TOKEN"))
-
-# Global session state
-call_state = {
-    "start_time": None,
-    "silence_events": 0,
-    "user_utterances": 0,
-    "unanswered_prompts": 0,
-    "last_speech_time": None,
-    "silence_duration": 0
-}
+_ALL_ENV_VARS = (*REQUIRED_ENV_VARS, *OPTIONAL_ENV_VARS)
+
+@lru_cache(maxsize=1)
+def get_env_status() -> Dict[str, bool]:
+    """Check the environment once per process and return which variables are set."""
+    env_status = {var: bool(os.getenv(var)) for var in _ALL_ENV_VARS}
+
+    # Log environment variables (without values for security)
+    logger.info("Checking environment variables...")
+    for var, description in REQUIRED_ENV_VARS.items():
+        if env_status[var]:
+            logger.info("%s is set", var)
+        else:
+            logger.error("%s is not set - %s (REQUIRED)", var, description)
+            raise ValueError(f"{var} is required but not set")
+
+    for var, description in OPTIONAL_ENV_VARS.items():
+        if env_status[var]:
+            logger.info("%s is set", var)
+        else:
+            logger.warning("%s is not set - %s", var, description)
+
+    return env_status
+
+@lru_cache(maxsize=1)
+def get_validator() -> RequestValidator:
+    """Return the process-wide Twilio request validator."""
+    return RequestValidator(os.environ["TWILIO_AUTH_TOKEN"])
+
+@lru_cache(maxsize=1024)
+def is_valid_twilio_signature(url: str, signature: str, params: FrozenSet[Tuple[str, Any]]) -> bool:
+    """Check a Twilio request signature.
+
+    Twilio retries webhooks with identical URL, parameters and signature, so the
+    result is cached on all three to skip recomputing the HMAC for replays.
+    """
+    return get_validator().validate(url, ImmutableMultiDict(list(params)), signature)
 
 # Pydantic models for request/response validation
 class TwilioRequest(BaseModel):
@@ -74,178 +105,217 @@ class TwilioResponse(BaseModel):
     next_prompt: Optional[str] = None
     end_call: Optional[bool] = None
 
-app = FastAPI(title="Phone Chatbot API")
+async def get_twilio_request(
+    request: Request, form: Annotated[TwilioRequest, Form()]
+) -> TwilioRequest:
+    """Bind the webhook body, accepting JSON as well as Twilio's form posts."""
+    if not request.headers.get("content-type", "").startswith("application/json"):
+        return form
+    try:
+        # Validate the raw bytes in one pass instead of json.loads + TwilioRequest(**data)
+        return TwilioRequest.model_validate_json(await request.body())
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+
+def json_response(content: Union[BaseModel, bytes]) -> Response:
+    """Return a response model, or JSON serialized ahead of time, without jsonable_encoder."""
+    if isinstance(content, BaseModel):
+        content = content.model_dump_json(exclude_none=True)
+    return Response(content=content, media_type="application/json")
+
+def serialize_reply(**fields: Any) -> bytes:
+    """Serialize a TwilioResponse built from the given fields."""
+    return TwilioResponse(**fields).model_dump_json(exclude_none=True).encode()
+
+# Fixed replies are serialized once at import instead of on every webhook
+GREETING_REPLY = serialize_reply(response="Hello! This is your AI phone assistant.", pause=5)
+STILL_THERE_REPLY = serialize_reply(response="Are you still there?", pause=5)
+QUIET_REPLY = serialize_reply(
+    response="I notice you've been quiet for a while. Are you still there?", pause=5
+)
+NO_RESPONSE_REPLY = serialize_reply(
+    response="No response detected after multiple attempts. Goodbye.", end_call=True
+)
+ERROR_REPLY = serialize_reply(
+    response="I apologize, but I'm having trouble processing your request. Please try again.",
+    pause=5,
+)
+CALL_ENDING_REPLY = serialize_reply(response="Call ending. Goodbye.", end_call=True)
+
+def build_health_payload() -> Dict[str, Any]:
+    """Describe the server for the health check. Nothing here changes while it runs."""
+    current_dir = os.getcwd()
+    logger.info("Current working directory: %s", current_dir)
+
+    return {
+        "status": "ok",
+        "message": "Phone Chatbot Server is running!",
+        "endpoints": {
+            "/": "Health check",
+            "/twilio": "Handle Twilio webhooks",
+            "/end": "End call and get summary"
+        },
+        "environment": {
+            "working_directory": current_dir,
+            "port": os.environ.get("PORT", "8000"),
+            "variables": get_env_status()
+        }
+    }
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Fail fast on missing configuration before accepting requests
+    get_env_status()
+
+    # Serialize the health check once; probes then cost a single Response
+    health_payload = build_health_payload()
+    logger.info("Health check response: %s", health_payload)
+    app.state.health_bytes = orjson.dumps(health_payload)
+
+    redis_url = os.getenv("REDIS_URL")
+    if redis_url:
+        redis_client = redis.Redis.from_url(redis_url, decode_responses=True)
+        app.state.call_store = RedisCallStore(redis_client)
+    else:
+        logger.warning("REDIS_URL is not set - keeping call state in process memory")
+        app.state.call_store = MemoryCallStore()
+    yield
+    if redis_url:
+        await redis_client.aclose()
+
+app = FastAPI(
+    title="Phone Chatbot API",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["POST", "GET"],
+    allow_headers=["content-type", "authorization"],
 )
 
 @app.get("/")
-async def home():
+async def home(request: Request):
     """Health check endpoint."""
-    try:
-        # Check if we're in the correct directory
-        current_dir = os.getcwd()
-        logger.info(f"Current working directory: {current_dir}")
-        
-        # List files in current directory
-        files = os.listdir(current_dir)
-        logger.info(f"Files in current directory: {files}")
-        
-        # Check environment variables
-        env_status = {
-            var: bool(os.getenv(var))
-            for var in {**REQUIRED_ENV_VARS, **OPTIONAL_ENV_VARS}.keys()
-        }
-        
-        response = {
-            "status": "ok",
-            "message": "Phone Chatbot Server is running!",
-            "endpoints": {
-                "/": "Health check",
-                "/twilio": "Handle Twilio webhooks",
-                "/end": "End call and get summary"
-            },
-            "environment": {
-                "working_directory": current_dir,
-                "port": os.environ.get("PORT", "8000"),
-                "variables": env_status
-            }
-        }
-        logger.info(f"Health check response: {response}")
-        return response
-    except Exception as e:
-        logger.error(f"Error in health check: {str(e)}")
-        logger.error(traceback.format_exc())
-        raise HTTPException(status_code=500, detail=str(e))
+    return Response(content=request.app.state.health_bytes, media_type="application/json")
 
-@app.post("/twilio", response_model=TwilioResponse)
-async def handle_call(request: Request):
+@app.post("/twilio", responses={200: {"model": TwilioResponse}})
+async def handle_call(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    payload: TwilioRequest = Depends(get_twilio_request),
+):
     """Handle incoming Twilio calls."""
     try:
-        # Get the request data
-        form_data = await request.form()
-        data = dict(form_data)
-        
-        # Log the incoming request data
-        logger.info(f"Received Twilio request data: {data}")
+        # Log a sample of incoming request data; formatting every payload is costly
+        if random.random() < REQUEST_LOG_SAMPLE_RATE:
+            logger.info("Received Twilio request data: %s", payload)
         
         # Validate Twilio request
         signature = request.headers.get("X-Twilio-Signature", "")
         url = str(request.url)
         
         # Log validation attempt
-        logger.info(f"Validating Twilio request with signature: {signature}")
-        logger.info(f"Request URL: {url}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Validating Twilio request with signature: %s", signature)
+            logger.debug("Request URL: %s", url)
         
-        if not twilio_validator.validate(url, data, signature):
+        # The signature covers every posted parameter, not just the ones bound
+        # to the model. FastAPI already parsed the form, so this is cached.
+        form_data = await request.form()
+        if not is_valid_twilio_signature(url, signature, frozenset(form_data.multi_items())):
             logger.error("Invalid Twilio signature")
             # For testing, we'll allow the request to proceed
             logger.warning("Skipping signature validation for testing")
             # raise HTTPException(status_code=403, detail="Invalid Twilio signature")
 
         # Log call details
-        logger.info(f"Received call from {data.get('From')} to {data.get('To')}")
-        logger.info(f"Call SID: {data.get('CallSid')}")
+        logger.info("Received call from %s to %s", payload.From, payload.To)
+        logger.info("Call SID: %s", payload.CallSid)
 
-        current_time = datetime.utcnow()
-        
-        if call_state["start_time"] is None:
-            call_state["start_time"] = current_time
-            call_state["last_speech_time"] = current_time
-            return TwilioResponse(
-                response="Hello! This is your AI phone assistant.",
-                pause=5
-            )
+        call_store = request.app.state.call_store
+        sid = payload.CallSid or ANONYMOUS_CALL_SID
+        # Wall-clock nanoseconds rather than a monotonic clock: the state may be
+        # written by other workers or hosts sharing the same Redis.
+        current_time = time.time_ns()
+
+        started, state = await call_store.begin(sid, current_time)
+        if started:
+            return json_response(GREETING_REPLY)
 
         # Handle speech or silence
-        speech_result = data.get("SpeechResult")
+        speech_result = payload.SpeechResult
         if speech_result:
-            call_state["user_utterances"] += 1
-            call_state["unanswered_prompts"] = 0
-            call_state["last_speech_time"] = current_time
-            call_state["silence_duration"] = 0
-            return TwilioResponse(
+            await call_store.incr(sid, user_utterances=1)
+            await call_store.set(
+                sid, unanswered_prompts=0, last_speech_time=current_time, silence_duration=0
+            )
+            return json_response(TwilioResponse(
                 response=f"You said: {speech_result}",
                 pause=5,
                 next_prompt="Do you want to continue?"
-            )
+            ))
         else:
             # No speech detected → silence
-            call_state["silence_events"] += 1
-            call_state["unanswered_prompts"] += 1
+            await call_store.incr(sid, silence_events=1, unanswered_prompts=1)
             
             # Calculate silence duration
-            if call_state["last_speech_time"]:
-                silence_duration = (current_time - call_state["last_speech_time"]).total_seconds()
-                call_state["silence_duration"] = silence_duration
+            if state.last_speech_time:
+                silence_duration = (current_time - state.last_speech_time) / 1e9
+                await call_store.set(sid, silence_duration=silence_duration)
                 
                 # If silence exceeds 10 seconds, play TTS prompt
                 if silence_duration >= 10:
-                    call_state["unanswered_prompts"] += 1
-                    if call_state["unanswered_prompts"] >= 3:
-                        log_summary()
-                        return TwilioResponse(
-                            response="No response detected after multiple attempts. Goodbye.",
-                            end_call=True
-                        )
-                    return TwilioResponse(
-                        response="I notice you've been quiet for a while. Are you still there?",
-                        pause=5
-                    )
-
-            return TwilioResponse(
-                response="Are you still there?",
-                pause=5
-            )
+                    counters = await call_store.incr(sid, unanswered_prompts=1)
+                    if counters["unanswered_prompts"] >= 3:
+                        # Summarize after the reply has been sent to Twilio
+                        background_tasks.add_task(log_summary, call_store, sid)
+                        return json_response(NO_RESPONSE_REPLY)
+                    return json_response(QUIET_REPLY)
+
+            return json_response(STILL_THERE_REPLY)
     except Exception as e:
-        logger.error(f"Error handling Twilio request: {str(e)}")
-        logger.error(traceback.format_exc())
-        # Return a more graceful error response
-        return TwilioResponse(
-            response="I apologize, but I'm having trouble processing your request. Please try again.",
-            pause=5
+        # Format the traceback after the fallback reply has gone out to Twilio
+        background_tasks.add_task(
+            logger.error, "Error handling Twilio request: %s", e, exc_info=e
         )
+        # Return a more graceful error response
+        return json_response(ERROR_REPLY)
 
-@app.post("/end", response_model=TwilioResponse)
-async def end_call():
+@app.post("/end", responses={200: {"model": TwilioResponse}})
+async def end_call(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    payload: TwilioRequest = Depends(get_twilio_request),
+):
     """End the call and get a summary."""
     try:
-        response = "Call ending. Goodbye."
-        log_summary()
-        return TwilioResponse(
-            response=response,
-            end_call=True
+        background_tasks.add_task(
+            log_summary, request.app.state.call_store, payload.CallSid or ANONYMOUS_CALL_SID
         )
+        return json_response(CALL_ENDING_REPLY)
     except Exception as e:
-        logger.error(f"Error ending call: {str(e)}")
+        logger.error("Error ending call: %s", e)
         logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
 
-def log_summary():
-    """Log call statistics."""
-    try:
-        duration = (datetime.utcnow() - call_state["start_time"]).total_seconds()
-        logger.info("\n📞 Call Summary:")
-        logger.info(f"  Duration: {duration:.2f} seconds")
-        logger.info(f"  Silence Events: {call_state['silence_events']}")
-        logger.info(f"  Longest Silence: {call_state['silence_duration']:.2f} seconds")
-        logger.info(f"  User Utterances: {call_state['user_utterances']}")
-        logger.info(f"  Unanswered Prompts: {call_state['unanswered_prompts']}")
-
-        # Reset state
-        for key in call_state:
-            call_state[key] = 0 if isinstance(call_state[key], int) else None
-    except Exception as e:
-        logger.error(f"Error logging summary: {str(e)}")
-        logger.error(traceback.format_exc())
-
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port) 
+    workers = int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1))
+    if workers > 1 and not os.getenv("REDIS_URL"):
+        # In-memory call state is per process, so workers would not see each other's calls
+        logger.warning("REDIS_URL is not set - running a single worker")
+        workers = 1
+    uvicorn.run(
+        "app:app",
+        host="0.0.0.0",
+        port=port,
+        workers=workers,
+        loop="uvloop",
+        http="httptools",
+    ) 
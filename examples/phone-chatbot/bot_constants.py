@@ -5,11 +5,13 @@
 MAX_SESSION_TIME = 5 * 60  # 5 minutes
 
 # Required environment variables
-REQUIRED_ENV_VARS = [
-    "DAILY_API_KEY",
-    "GOOGLE_API_KEY",
-    "DEEPGRAM_API_KEY",
-]
+REQUIRED_ENV_VARS = frozenset(
+    {
+        "DAILY_API_KEY",
+        "GOOGLE_API_KEY",
+        "DEEPGRAM_API_KEY",
+    }
+)
 
 # Default example to use when handling dialin webhooks - determines which bot type to run
 DEFAULT_DIALIN_EXAMPLE = "call_transfer"  # Options: call_transfer, simple_dialin
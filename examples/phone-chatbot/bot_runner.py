@@ -1,12 +1,14 @@
 import argparse
-import json
+import asyncio
+import hmac
 import os
-import shlex
-import subprocess
+import time
+from collections import defaultdict
 from contextlib import asynccontextmanager
-from typing import Any, Dict, Optional
+from typing import Any, DefaultDict, Dict, Optional, Set, Tuple
 
 import aiohttp
+import orjson
 from bot_constants import (
     MAX_SESSION_TIME,
     REQUIRED_ENV_VARS,
@@ -18,10 +20,11 @@ from bot_runner_helpers import (
     process_dialin_request,
 )
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Request, APIRouter, BackgroundTasks
+from logging_config import configure_logging
+from fastapi import FastAPI, HTTPException, Request, Response, APIRouter, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import BaseModel, ConfigDict
 import logging
 import sys
 import traceback
@@ -37,31 +40,68 @@ load_dotenv(override=True)
 
 daily_helpers = {}
 
+# Running bot processes, mapped to the task that waits for each one to exit
+bot_processes: Dict[asyncio.subprocess.Process, asyncio.Task] = {}
+
+# Maximum number of bot processes running at once across all server workers.
+# The semaphore is per process, so each worker gets an equal share (at least one).
+BOT_CONCURRENCY = int(os.getenv("BOT_CONCURRENCY", "8"))
+# Set by gunicorn.conf.py; unset when running a single process via __main__
+BOT_WORKERS = max(1, int(os.getenv("BOT_WORKERS", "1")))
+BOT_CONCURRENCY_PER_WORKER = max(1, BOT_CONCURRENCY // BOT_WORKERS)
+_bot_semaphore = asyncio.Semaphore(BOT_CONCURRENCY_PER_WORKER)
+
+# Bots run as modules of this directory under the current interpreter
+BOT_ARGV_PREFIX = (sys.executable, "-m")
+BOT_CWD = os.path.dirname(os.path.abspath(__file__))
+
+# /start calls still creating their room, keyed by room name and canonical
+# config, so a retried request joins the original instead of creating a second
+# room. Like the token cache below, this only spans one worker process.
+_inflight: Dict[Tuple[str, bytes], asyncio.Task] = {}
+
+# Bot spawns in progress, kept here so they aren't garbage collected mid-run
+_spawn_tasks: Set[asyncio.Task] = set()
+
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    stream=sys.stdout
-)
+configure_logging(logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Optional environment variables
 OPTIONAL_ENV_VARS = {
     "DAILY_API_KEY": "Daily.co API key (optional)",
     "GOOGLE_API_KEY": "Google API key (optional)",
-    "DEEPGRAM_API_KEY": "Deepgram API key (optional)"
+    "DEEPGRAM_API_KEY": "Deepgram API key (optional)",
+    "ALLOWED_ORIGINS": "Comma-separated CORS origins (optional)",
+    "BOT_RUNNER_API_KEY": "Shared secret required on /start and /stop (optional)"
 }
 
+# Browser origins allowed to call the API; credentials can't be combined with "*"
+ALLOWED_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv("ALLOWED_ORIGINS", "https://example.com").split(",")
+    if origin.strip()
+]
+
 # Log environment variables (without values for security)
 logger.info("Checking environment variables...")
 for var, description in OPTIONAL_ENV_VARS.items():
     if os.getenv(var):
-        logger.info(f"{var} is set")
+        logger.info("%s is set", var)
     else:
-        logger.warning(f"{var} is not set - {description}")
+        logger.warning("%s is not set - %s", var, description)
 
 # Pydantic models
 class BotStartRequest(BaseModel):
+    # Daily's dial-in webhook posts From/To/callId/callDomain with no config,
+    # so unknown fields are kept for process_dialin_request
+    model_config = ConfigDict(extra="allow")
+
+    room_name: Optional[str] = None
+    bot_name: Optional[str] = "AI Assistant"
+    config: Optional[Dict[str, Any]] = None
+
+class BotStopRequest(BaseModel):
     room_name: str
     bot_name: Optional[str] = "AI Assistant"
 
@@ -70,23 +110,70 @@ class BotResponse(BaseModel):
     message: str
     room_name: Optional[str] = None
     bot_name: Optional[str] = None
+    room_url: Optional[str] = None
 
 router = APIRouter()
 
 # ----------------- Environment Validation ----------------- #
 
 def validate_environment():
-    missing_vars = []
-    for var in REQUIRED_ENV_VARS:
-        if not os.getenv(var):
-            missing_vars.append(var)
+    missing_vars = REQUIRED_ENV_VARS - os.environ.keys()
     if missing_vars:
-        print(f"Warning: Missing environment variables: {', '.join(missing_vars)}")
+        logger.warning("Missing environment variables: %s", ", ".join(sorted(missing_vars)))
         return False
     return True
 
+# ----------------- Access Control ----------------- #
+
+# /start creates Daily rooms and forks bot processes, so when this secret is set
+# only callers that present it are served
+BOT_RUNNER_API_KEY = os.getenv("BOT_RUNNER_API_KEY", "")
+
+
+async def require_api_key(authorization: Optional[str] = Header(None)):
+    """Check the shared secret sent as a Bearer token, if one is configured."""
+    if not BOT_RUNNER_API_KEY:
+        return
+
+    presented = ""
+    if authorization and authorization.startswith("Bearer "):
+        presented = authorization[len("Bearer "):]
+    if not hmac.compare_digest(presented.encode(), BOT_RUNNER_API_KEY.encode()):
+        raise HTTPException(status_code=401, detail="Invalid or missing API key")
+
 # ----------------- Daily Room Management ----------------- #
 
+# Reuse a token while it has at least this many seconds left
+TOKEN_REFRESH_MARGIN = 60
+
+# Meeting tokens for existing rooms: room URL -> (token, monotonic time to refresh at)
+_token_cache: Dict[str, Tuple[str, float]] = {}
+_token_locks: DefaultDict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+
+async def get_cached_token(room_url: str) -> str:
+    """Get a meeting token for an existing room, reusing a cached one while it is valid.
+
+    Concurrent requests for the same room wait on a per-room lock, so only one of
+    them calls the Daily API and the rest get its token.
+
+    Args:
+        room_url: URL of the Daily room
+
+    Returns:
+        Meeting token for the room
+    """
+    async with _token_locks[room_url]:
+        now = time.monotonic()
+        cached = _token_cache.get(room_url)
+        if cached and cached[1] > now:
+            return cached[0]
+
+        token = await daily_helpers["rest"].get_token(room_url, MAX_SESSION_TIME)
+        if token:
+            _token_cache[room_url] = (token, now + MAX_SESSION_TIME - TOKEN_REFRESH_MARGIN)
+        return token
+
 
 async def create_daily_room(room_url: str = None, config_body: Dict[str, Any] = None):
     """Create or retrieve a Daily room with appropriate properties based on the configuration.
@@ -117,24 +204,34 @@ async def create_daily_room(room_url: str = None, config_body: Dict[str, Any] =
             properties.enable_dialout = True
 
         # Log the capabilities being used
-        capability_str = ", ".join([f"{k}={v}" for k, v in capabilities.items()])
-        print(f"Creating room with capabilities: {capability_str}")
+        logger.info("Creating room with capabilities: %s", capabilities)
 
         params = DailyRoomParams(properties=properties)
 
-        print("Creating new room...")
+        logger.info("Creating new room...")
         room = await daily_helpers["rest"].create_room(params=params)
+
+        # Get token for the agent, overlapping the request with the logging below
+        token_task = asyncio.create_task(
+            daily_helpers["rest"].get_token(room.url, MAX_SESSION_TIME)
+        )
     else:
-        # Check if passed room URL exists
-        try:
-            room = await daily_helpers["rest"].get_room_from_url(room_url)
-        except Exception:
+        # The token only needs the URL, so request it while checking the room exists
+        room, token = await asyncio.gather(
+            daily_helpers["rest"].get_room_from_url(room_url),
+            get_cached_token(room_url),
+            return_exceptions=True,
+        )
+        if isinstance(room, Exception):
             raise HTTPException(status_code=500, detail=f"Room not found: {room_url}")
+        if isinstance(token, Exception):
+            raise HTTPException(status_code=500, detail=f"Failed to get token: {token}")
+        token_task = None
 
-    print(f"Daily room: {room.url} {room.config.sip_endpoint}")
+    logger.info("Daily room: %s %s", room.url, room.config.sip_endpoint)
 
-    # Get token for the agent
-    token = await daily_helpers["rest"].get_token(room.url, MAX_SESSION_TIME)
+    if token_task:
+        token = await token_task
 
     if not room or not token:
         raise HTTPException(status_code=500, detail="Failed to get room or token")
@@ -145,9 +242,14 @@ async def create_daily_room(room_url: str = None, config_body: Dict[str, Any] =
 # ----------------- Bot Process Management ----------------- #
 
 
-async def start_bot(room_details: Dict[str, str], body: Dict[str, Any], example: str) -> bool:
+async def _spawn_bot_process(room_details: Dict[str, str], body: Dict[str, Any], example: str) -> bool:
     """Start a bot process with the given configuration.
 
+    Runs in its own task once the room is ready, outside any request, so
+    failures are logged rather than raised. The caller must already hold a
+    slot in _bot_semaphore; it is released when the process exits or fails to
+    start.
+
     Args:
         room_details: Room URL and token
         body: Bot configuration
@@ -159,20 +261,48 @@ async def start_bot(room_details: Dict[str, str], body: Dict[str, Any], example:
     room_url = room_details["room"]
     token = room_details["token"]
 
-    # Properly format body as JSON string for command line
-    body_json = json.dumps(body).replace('"', '\\"')
-    print(f"++++ Body JSON: {body_json}")
+    # The body goes over stdin, so its size isn't capped by ARG_MAX and it
+    # doesn't show up in the process list
+    body_json = orjson.dumps(body)
 
     # Modified to use non-LLM-specific bot module names
-    bot_proc = f'python3 -m {example} -u {room_url} -t {token} -b "{body_json}"'
-    print(f"Starting bot. Example: {example}, Room: {room_url}")
+    logger.info("Starting bot. Example: %s, Room: %s", example, room_url)
 
     try:
-        command_parts = shlex.split(bot_proc)
-        subprocess.Popen(command_parts, bufsize=1, cwd=os.path.dirname(os.path.abspath(__file__)))
-        return True
+        proc = await asyncio.create_subprocess_exec(
+            *BOT_ARGV_PREFIX,
+            example,
+            "-u",
+            room_url,
+            "-t",
+            token,
+            stdin=asyncio.subprocess.PIPE,
+            cwd=BOT_CWD,
+        )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to start subprocess: {e}")
+        _bot_semaphore.release()
+        logger.error("Failed to start subprocess: %s", e)
+        return False
+
+    def on_exit(_):
+        bot_processes.pop(proc, None)
+        _bot_semaphore.release()
+
+    # Reap the process when it exits instead of leaving a zombie behind
+    reaper = asyncio.create_task(proc.wait())
+    bot_processes[proc] = reaper
+    reaper.add_done_callback(on_exit)
+
+    try:
+        proc.stdin.write(body_json)
+        proc.stdin.write_eof()
+        await proc.stdin.drain()
+    except (BrokenPipeError, ConnectionResetError) as e:
+        logger.error("Bot exited before reading its configuration: %s", e)
+        return False
+    finally:
+        proc.stdin.close()
+    return True
 
 
 # ----------------- API Setup ----------------- #
@@ -180,24 +310,47 @@ async def start_bot(room_details: Dict[str, str], body: Dict[str, Any], example:
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    aiohttp_session = aiohttp.ClientSession()
+    # Keep connections to the Daily API alive across calls so that create_room
+    # and get_token don't each pay for a new TLS handshake. Lookups go through
+    # aiodns on the event loop rather than getaddrinfo in the thread pool.
+    connector = aiohttp.TCPConnector(
+        resolver=aiohttp.AsyncResolver(),
+        limit=100,
+        limit_per_host=50,
+        ttl_dns_cache=300,
+        keepalive_timeout=75,
+        enable_cleanup_closed=True,
+    )
+    aiohttp_session = aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=10, connect=3),
+    )
     daily_helpers["rest"] = DailyRESTHelper(
         daily_api_key=os.getenv("DAILY_API_KEY", ""),
         daily_api_url=os.getenv("DAILY_API_URL", "https://api.daily.co/v1"),
         aiohttp_session=aiohttp_session,
     )
+
+    # The environment doesn't change while the server runs, so serialize the
+    # /health body once instead of on every probe
+    app.state.env_status = {var: bool(os.getenv(var)) for var in OPTIONAL_ENV_VARS}
+    app.state.health_bytes = orjson.dumps({
+        "status": "ok",
+        "message": "Bot Runner is healthy",
+        "environment": {"variables": app.state.env_status},
+    })
     yield
     await aiohttp_session.close()
 
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["POST", "GET"],
+    allow_headers=["content-type", "authorization"],
 )
 
 
@@ -205,53 +358,103 @@ app.add_middleware(
 
 
 @router.get("/health")
-async def health_check():
+async def health_check(request: Request):
     """Health check endpoint."""
-    try:
-        env_status = {
-            var: bool(os.getenv(var))
-            for var in OPTIONAL_ENV_VARS.keys()
-        }
-        
-        return {
-            "status": "ok",
-            "message": "Bot Runner is healthy",
-            "environment": {
-                "variables": env_status
-            }
-        }
-    except Exception as e:
-        logger.error(f"Error in health check: {str(e)}")
-        logger.error(traceback.format_exc())
-        raise HTTPException(status_code=500, detail=str(e))
+    # The body is prebuilt; only this worker's bot counts change at runtime, so they
+    # travel in headers rather than forcing a re-encode per probe
+    return Response(
+        content=request.app.state.health_bytes,
+        media_type="application/json",
+        headers={
+            "X-Bots-Running": str(len(bot_processes)),
+            "X-Bots-Limit": str(BOT_CONCURRENCY_PER_WORKER),
+        },
+    )
+
+
+async def _do_start(
+    request: BotStartRequest,
+) -> Tuple[BotResponse, Tuple[Dict[str, str], Dict[str, Any], str]]:
+    """Create the room for a /start request.
+
+    Returns:
+        The response to send and the arguments for spawning the bot
+    """
+    logger.info("Starting bot %s in room %s", request.bot_name, request.room_name)
+
+    if request.config is not None:
+        body = request.config
+    else:
+        body = await process_dialin_request(request.model_extra or {})
+    body = bot_registry.setup_configuration(body)
+    example = bot_registry.detect_bot_type(body)
+    room_details = await create_daily_room(os.getenv("DAILY_SAMPLE_ROOM_URL"), body)
+
+    response = BotResponse(
+        status="success",
+        message=f"Bot {request.bot_name} started in room {request.room_name or room_details['room']}",
+        room_name=request.room_name,
+        bot_name=request.bot_name,
+        room_url=room_details["room"],
+    )
+    return response, (room_details, body, example)
+
 
+def _spawn_when_ready(task: asyncio.Task):
+    """Hand the start's bot slot to a bot process once its room is ready, or free it."""
+    if task.cancelled() or task.exception() is not None:
+        _bot_semaphore.release()
+        return
+    _, spawn_args = task.result()
+    spawn = asyncio.create_task(_spawn_bot_process(*spawn_args))
+    _spawn_tasks.add(spawn)
+    spawn.add_done_callback(_spawn_tasks.discard)
 
-@router.post("/start", response_model=BotResponse)
-async def start_bot(request: BotStartRequest, background_tasks: BackgroundTasks):
+
+@router.post("/start", response_model=BotResponse, dependencies=[Depends(require_api_key)])
+async def start_bot(request: BotStartRequest):
     """Start a bot in a room."""
+    # Only identical requests are merged; a different call in the same room
+    # (e.g. another dial-in callId) gets its own room and bot
+    payload = request.config if request.config is not None else request.model_extra
+    key = (request.room_name or "", orjson.dumps(payload, option=orjson.OPT_SORT_KEYS))
+    task = _inflight.get(key)
+    if task is None:
+        # Refuse up front rather than report success for a bot that would have
+        # to queue for a slot. acquire() doesn't yield while the semaphore isn't
+        # locked, so no other request can take the slot in between. The slot is
+        # held until the bot process exits.
+        if _bot_semaphore.locked():
+            raise HTTPException(status_code=503, detail="All bot slots are busy, try again later")
+        await _bot_semaphore.acquire()
+
+        # The bot is spawned by the task itself, so it starts even if every
+        # caller waiting on the room has gone away, and never more than once
+        task = asyncio.create_task(_do_start(request))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+        task.add_done_callback(_spawn_when_ready)
+    else:
+        logger.info("Identical start already in progress for room %s, waiting for it", key[0])
+
     try:
-        logger.info(f"Starting bot {request.bot_name} in room {request.room_name}")
-        
-        # Add your bot initialization logic here
-        # This is where you would integrate with your bot framework
-        
-        return BotResponse(
-            status="success",
-            message=f"Bot {request.bot_name} started in room {request.room_name}",
-            room_name=request.room_name,
-            bot_name=request.bot_name
-        )
+        # Shielded so one caller disconnecting doesn't cancel the others' start
+        response, _ = await asyncio.shield(task)
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error starting bot: {str(e)}")
+        logger.error("Error starting bot: %s", e)
         logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
 
+    return response
+
 
-@router.post("/stop", response_model=BotResponse)
-async def stop_bot(request: BotStartRequest):
+@router.post("/stop", response_model=BotResponse, dependencies=[Depends(require_api_key)])
+async def stop_bot(request: BotStopRequest):
     """Stop a bot in a room."""
     try:
-        logger.info(f"Stopping bot {request.bot_name} in room {request.room_name}")
+        logger.info("Stopping bot %s in room %s", request.bot_name, request.room_name)
         
         # Add your bot cleanup logic here
         
@@ -262,18 +465,21 @@ async def stop_bot(request: BotStartRequest):
             bot_name=request.bot_name
         )
     except Exception as e:
-        logger.error(f"Error stopping bot: {str(e)}")
+        logger.error("Error stopping bot: %s", e)
         logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
 
 
+app.include_router(router)
+
+
 # ----------------- Main ----------------- #
 
 if __name__ == "__main__":
     # Check environment variables
-    for env_var in REQUIRED_ENV_VARS:
-        if env_var not in os.environ:
-            raise Exception(f"Missing environment variable: {env_var}.")
+    missing_vars = REQUIRED_ENV_VARS - os.environ.keys()
+    if missing_vars:
+        raise Exception(f"Missing environment variables: {', '.join(sorted(missing_vars))}.")
 
     parser = argparse.ArgumentParser(description="Pipecat Bot Runner")
     parser.add_argument(
@@ -287,7 +493,14 @@ if __name__ == "__main__":
     try:
         import uvicorn
 
-        uvicorn.run("bot_runner:app", host=config.host, port=config.port, reload=config.reload)
+        uvicorn.run(
+            "bot_runner:app",
+            host=config.host,
+            port=config.port,
+            reload=config.reload,
+            loop="uvloop",
+            http="httptools",
+        )
 
     except KeyboardInterrupt:
-        print("Pipecat runner shutting down...")
+        logger.info("Pipecat runner shutting down...")
@@ -12,6 +12,7 @@ contact information. Also includes call state management.
 
 import json
 import os
+import sys
 from typing import Any, Dict, List, Optional
 
 from loguru import logger
@@ -188,6 +189,17 @@ class SessionManager:
                 self.call_flow_state.set_operator_disconnected()
 
 
+def read_stdin_body() -> Optional[str]:
+    """Read the JSON body that bot_runner writes to the bot's stdin.
+
+    Returns:
+        The body string, or None when stdin is a terminal or empty
+    """
+    if sys.stdin is None or sys.stdin.isatty():
+        return None
+    return sys.stdin.buffer.read().decode() or None
+
+
 class CallConfigManager:
     """Manages customer/operator relationships and call routing."""
 
@@ -0,0 +1,179 @@
+# call_state.py
+"""Per-call state for the Twilio webhook server, stored in Redis or in memory."""
+
+import logging
+import time
+import traceback
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Any, Dict, Optional, Tuple, Union
+
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+# Call state lives in a Redis hash per CallSid so that it is shared across
+# workers and survives restarts. Entries expire, in Redis or in memory, if a
+# call never ends cleanly.
+CALL_STATE_TTL = 24 * 60 * 60  # 1 day
+ANONYMOUS_CALL_SID = "anonymous"  # Used when a request carries no CallSid
+
+
+@dataclass(slots=True)
+class CallState:
+    """Statistics tracked for a single call."""
+
+    start_time: Optional[int] = None  # time.time_ns() when the call started
+    silence_events: int = 0
+    user_utterances: int = 0
+    unanswered_prompts: int = 0
+    last_speech_time: Optional[int] = None  # time.time_ns() of the last utterance
+    silence_duration: float = 0.0
+
+
+# How to decode each call state field read back from Redis
+CALL_STATE_FIELDS = {
+    "start_time": int,
+    "silence_events": int,
+    "user_utterances": int,
+    "unanswered_prompts": int,
+    "last_speech_time": int,
+    "silence_duration": float,
+}
+
+
+class RedisCallStore:
+    """Per-call state stored at ``call:{sid}`` in Redis."""
+
+    def __init__(self, client: redis.Redis):
+        self._client = client
+
+    @staticmethod
+    def _key(sid: str) -> str:
+        return f"call:{sid}"
+
+    @staticmethod
+    def _decode(raw: Dict[str, str]) -> CallState:
+        return CallState(**{field: CALL_STATE_FIELDS[field](value) for field, value in raw.items()})
+
+    async def begin(self, sid: str, now: int) -> Tuple[bool, CallState]:
+        """Start tracking a call unless it already started, and return its state.
+
+        HSETNX makes the check-and-set atomic, so concurrent first webhooks for the
+        same call only start it once.
+        """
+        key = self._key(sid)
+        async with self._client.pipeline(transaction=True) as pipe:
+            pipe.hsetnx(key, "start_time", now)
+            pipe.hsetnx(key, "last_speech_time", now)
+            pipe.hgetall(key)
+            pipe.expire(key, CALL_STATE_TTL)
+            started, _, raw, _ = await pipe.execute()
+        return bool(started), self._decode(raw)
+
+    async def incr(self, sid: str, **amounts: int) -> Dict[str, int]:
+        """Atomically increment counters and return their new values."""
+        key = self._key(sid)
+        async with self._client.pipeline(transaction=True) as pipe:
+            for field, amount in amounts.items():
+                pipe.hincrby(key, field, amount)
+            pipe.expire(key, CALL_STATE_TTL)
+            results = await pipe.execute()
+        return dict(zip(amounts, results))
+
+    async def set(self, sid: str, **fields: Any):
+        """Overwrite fields of the call state."""
+        key = self._key(sid)
+        async with self._client.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping=fields)
+            pipe.expire(key, CALL_STATE_TTL)
+            await pipe.execute()
+
+    async def pop(self, sid: str) -> CallState:
+        """Remove the call state and return what it held."""
+        key = self._key(sid)
+        async with self._client.pipeline(transaction=True) as pipe:
+            pipe.hgetall(key)
+            pipe.delete(key)
+            raw, _ = await pipe.execute()
+        return self._decode(raw)
+
+
+class MemoryCallStore:
+    """Per-call state kept in process memory, for running without Redis.
+
+    State is not shared between workers, so only use this with a single worker.
+    None of the methods await, so each one runs without interleaving with other
+    requests on the event loop and needs no lock. Like the Redis store, a call
+    expires CALL_STATE_TTL after it was last touched.
+    """
+
+    def __init__(self):
+        # sid -> (state, monotonic expiry), ordered by last use so that expired
+        # calls are always at the front
+        self._calls: "OrderedDict[str, Tuple[CallState, float]]" = OrderedDict()
+
+    def _evict(self, now: float):
+        while self._calls:
+            _, expires = next(iter(self._calls.values()))
+            if expires > now:
+                break
+            self._calls.popitem(last=False)
+
+    def _get(self, sid: str) -> CallState:
+        now = time.monotonic()
+        self._evict(now)
+        entry = self._calls.get(sid)
+        state = entry[0] if entry else CallState()
+        self._calls[sid] = (state, now + CALL_STATE_TTL)
+        self._calls.move_to_end(sid)
+        return state
+
+    async def begin(self, sid: str, now: int) -> Tuple[bool, CallState]:
+        """Start tracking a call unless it already started, and return its state."""
+        state = self._get(sid)
+        started = state.start_time is None
+        if started:
+            state.start_time = state.last_speech_time = now
+        return started, replace(state)
+
+    async def incr(self, sid: str, **amounts: int) -> Dict[str, int]:
+        """Increment counters and return their new values."""
+        state = self._get(sid)
+        for field, amount in amounts.items():
+            setattr(state, field, getattr(state, field) + amount)
+        return {field: getattr(state, field) for field in amounts}
+
+    async def set(self, sid: str, **fields: Any):
+        """Overwrite fields of the call state."""
+        state = self._get(sid)
+        for field, value in fields.items():
+            setattr(state, field, value)
+
+    async def pop(self, sid: str) -> CallState:
+        """Remove the call state and return what it held."""
+        self._evict(time.monotonic())
+        entry = self._calls.pop(sid, None)
+        return entry[0] if entry else CallState()
+
+
+CallStore = Union[RedisCallStore, MemoryCallStore]
+
+
+async def log_summary(call_store: CallStore, sid: str):
+    """Log call statistics and clear the call state."""
+    try:
+        state = await call_store.pop(sid)
+        if state.start_time is None:
+            logger.warning("No call state to summarize for call %s", sid)
+            return
+        duration = (time.time_ns() - state.start_time) / 1e9
+        logger.info("\n📞 Call Summary (%s):", sid)
+        logger.info("  Duration: %.2f seconds", duration)
+        logger.info("  Silence Events: %d", state.silence_events)
+        logger.info("  Longest Silence: %.2f seconds", state.silence_duration)
+        logger.info("  User Utterances: %d", state.user_utterances)
+        logger.info("  Unanswered Prompts: %d", state.unanswered_prompts)
+    except Exception as e:
+        logger.error("Error logging summary: %s", e)
+        logger.error(traceback.format_exc())
@@ -1,6 +1,7 @@
 import multiprocessing
 import os
 from dotenv import load_dotenv
+from uvicorn.workers import UvicornWorker
 
 # Load environment variables
 load_dotenv()
@@ -9,13 +10,27 @@ load_dotenv()
 bind = "0.0.0.0:8000"
 backlog = 2048
 
+class UvloopWorker(UvicornWorker):
+    """Uvicorn worker that requires uvloop and httptools instead of auto-detecting them."""
+
+    CONFIG_KWARGS = {**UvicornWorker.CONFIG_KWARGS, "loop": "uvloop", "http": "httptools"}
+
 # Worker processes
-workers = 2  # Reduced from 4 to 2 for better stability
-worker_class = "uvicorn.workers.UvicornWorker"
+# app.py keeps call state per process unless REDIS_URL is set, so only scale
+# out by default when there is Redis to share it.
+_default_workers = multiprocessing.cpu_count() * 2 + 1 if os.getenv("REDIS_URL") else 1
+workers = max(1, int(os.getenv("WEB_CONCURRENCY", _default_workers)))
+# Workers inherit this, so bot_runner.py can split BOT_CONCURRENCY between them
+os.environ["BOT_WORKERS"] = str(workers)
+worker_class = UvloopWorker
 worker_connections = 1000
 timeout = 120  # Increased timeout
+graceful_timeout = 30
 keepalive = 2
 
+# Workers are not recycled (no max_requests): app.py may hold live calls in
+# memory, and bot_runner.py tracks its running bots per worker
+
 # Logging
 accesslog = "-"
 errorlog = "-"
@@ -0,0 +1,38 @@
+# logging_config.py
+"""Logging setup shared by the phone chatbot servers."""
+
+import atexit
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+def configure_logging(level: int = logging.INFO) -> QueueListener:
+    """Send log records to stdout from a background thread.
+
+    The root logger only enqueues records, and a QueueListener thread does the
+    actual writes, so a slow stdout never blocks the event loop. The listener is
+    stopped at exit to flush anything still queued.
+
+    Args:
+        level: Level for the root logger
+
+    Returns:
+        The started QueueListener
+    """
+    log_queue = queue.SimpleQueue()
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.handlers[:] = [QueueHandler(log_queue)]
+
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -8,7 +8,7 @@ import asyncio
 import os
 import sys
 
-from call_connection_manager import CallConfigManager
+from call_connection_manager import CallConfigManager, read_stdin_body
 from dotenv import load_dotenv
 from loguru import logger
 
@@ -172,10 +172,16 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Simple Dial-out Bot")
     parser.add_argument("-u", "--url", type=str, help="Room URL")
     parser.add_argument("-t", "--token", type=str, help="Room Token")
-    parser.add_argument("-b", "--body", type=str, help="JSON configuration string")
+    parser.add_argument(
+        "-b", "--body", type=str, help="JSON configuration string (read from stdin if omitted)"
+    )
 
     args = parser.parse_args()
 
+    # bot_runner sends the body over stdin; -b is kept for running a bot by hand
+    if not args.body:
+        args.body = read_stdin_body()
+
     # Log the arguments for debugging
     logger.info(f"Room URL: {args.url}")
     logger.info(f"Token: {args.token}")
@@ -0,0 +1,94 @@
+import asyncio
+import os
+
+import aiohttp
+import orjson
+
+# Point at a deployment (e.g. https://p-production-7684.up.railway.app) to smoke-test it
+BASE_URL = os.getenv("BASE_URL", "http://localhost:8000")
+
+WEBHOOK_HEADERS = {
+    "Content-Type": "application/x-www-form-urlencoded",
+    "X-Twilio-Signature": "test_signature"
+}
+
+WEBHOOK_CASES = [
+    {
+        "description": "Normal speech event",
+        "data": {
+            "CallSid": "test_call_sid_1",
+            "From": "+15076077082",
+            "To": "+15076077082",
+            "SpeechResult": "Hello, this is a test"
+        }
+    },
+    {
+        "description": "Silence event (no SpeechResult)",
+        "data": {
+            "CallSid": "test_call_sid_2",
+            "From": "+15076077082",
+            "To": "+15076077082"
+            # No SpeechResult
+        }
+    }
+]
+
+def print_response(title, status, body):
+    print(f"\n{title}:")
+    print(f"Status Code: {status}")
+    try:
+        print(f"Response: {orjson.dumps(orjson.loads(body), option=orjson.OPT_INDENT_2).decode()}")
+    except orjson.JSONDecodeError:
+        print(f"Raw Response: {body.decode(errors='replace')}")
+
+async def request(session, title, method, path, **kwargs):
+    try:
+        async with session.request(method, f"{BASE_URL}{path}", **kwargs) as response:
+            body = await response.read()
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        print(f"\n{title}:")
+        print(f"Error: {e}")
+        return
+    print_response(title, response.status, body)
+
+async def health(session):
+    await request(session, "Health Check (/)", "GET", "/")
+
+async def twilio_speech(session):
+    data = {"SpeechResult": "Hello, this is a test"}
+    await request(session, "Twilio Speech (/twilio)", "POST", "/twilio", json=data)
+
+async def twilio_silence(session):
+    data = {}  # Empty data simulates silence
+    await request(session, "Twilio Silence (/twilio)", "POST", "/twilio", json=data)
+
+async def end_call(session):
+    await request(session, "End Call (/end)", "POST", "/end")
+
+async def call_flow(session):
+    # These steps share one call's state on the server, so they run in order
+    await twilio_speech(session)
+    await twilio_silence(session)
+    await end_call(session)
+
+async def twilio_webhook(session, case):
+    await request(
+        session,
+        f"Webhook: {case['description']}",
+        "POST",
+        "/twilio",
+        data=case["data"],
+        headers=WEBHOOK_HEADERS,
+    )
+
+async def run_all():
+    # One session and connection pool for every probe; independent probes overlap
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(
+            health(session),
+            call_flow(session),
+            *[twilio_webhook(session, case) for case in WEBHOOK_CASES],
+        )
+
+if __name__ == "__main__":
+    asyncio.run(run_all())